@@ -0,0 +1,156 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class QualitySelector:
+    def __init__(self, session, get_segments, verify=False, sample_segments=3):
+        '''
+        Chooses the HLS variant to download from the measured bandwidth,
+        so the download fits in a byte budget and/or a wall-clock deadline.
+
+        Args:
+            session (requests.Session): The HTTP session used for the playlists and samples.
+            get_segments (Callable[[str], tuple[list[str], list[float]]]): Returns the segment URLs
+                and durations of a media playlist (e.g. `_123AV.__get_segments`).
+            verify (bool, optional): Whether to verify SSL certificates. Defaults to False.
+            sample_segments (int, optional): How many segments to download for the throughput
+                sample. Defaults to 3.
+        '''
+        self.session = session
+        self.get_segments = get_segments
+        self.verify = verify
+        self.sample_segments = sample_segments
+        # 計測でダウンロードしたセグメント {url: bytes}（選ばれた画質のものだけ残す）
+        self.samples = {}
+
+    def get_variants(self, master_url):
+        '''
+        Parses the master playlist into its variants.
+
+        Args:
+            master_url (str): The URL of the master `.m3u8` playlist.
+
+        Returns:
+            list[dict]: The variants ('url', 'bandwidth', 'pixels'), best quality first.
+        '''
+        res = self.session.get(master_url, verify=self.verify)
+        if res.status_code != 200:
+            raise Exception(f"Failed to get master_url: {res.status_code}")
+
+        variants = []
+        lines = res.text.strip().splitlines()
+        for i, line in enumerate(lines):
+            if line.startswith('#EXT-X-STREAM-INF:') and i + 1 < len(lines):
+                bandwidth = re.search(r'[:,]BANDWIDTH=(\d+)', line)
+                resolution = re.search(r'RESOLUTION=(\d+)x(\d+)', line)
+                variants.append({
+                    'url': master_url.rsplit('/', 1)[0] + '/' + lines[i + 1].strip(),
+                    'bandwidth': int(bandwidth.group(1)) if bandwidth else None,
+                    'pixels': int(resolution.group(1)) * int(resolution.group(2)) if resolution else 0,
+                })
+        if not variants:
+            raise ValueError(f"No variants found in {master_url}")
+        return sorted(variants, key=lambda v: (v['pixels'], v['bandwidth'] or 0), reverse=True)
+
+    def __fetch(self, url):
+        res = self.session.get(url, verify=self.verify, timeout=30)
+        res.raise_for_status()
+        return res.content
+
+    def sample(self, segment_urls, durations):
+        '''
+        Downloads the first few segments in parallel and measures the throughput.
+        The downloaded segments are kept in `samples`, so they can be reused.
+
+        Args:
+            segment_urls (list[str]): Segment URLs of the sampled variant.
+            durations (list[float]): Segment durations of the sampled variant.
+
+        Returns:
+            tuple[float, float]: Throughput (bytes/s) and bitrate of the variant (bytes per second of video).
+        '''
+        n = max(1, min(self.sample_segments, len(segment_urls)))
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=n) as executor:
+            contents = list(executor.map(self.__fetch, segment_urls[:n]))
+        elapsed = max(time.monotonic() - start, 1e-3)
+        self.samples = dict(zip(segment_urls[:n], contents))
+        size = sum(len(content) for content in contents)
+        media_seconds = sum(durations[:n]) or n
+        return size / elapsed, size / media_seconds
+
+    def choose(self, master_urls, max_bytes=None, deadline=None):
+        '''
+        Picks one quality level for every part: the highest one whose estimated size
+        fits in `max_bytes` and whose estimated download time fits in `deadline`.
+
+        The segments downloaded for the throughput sample count against both budgets.
+        If the sampled (best) variant is chosen, they are kept in `samples` and reused;
+        otherwise `samples` is cleared.
+
+        The same level is used for all parts, because the segments are joined with
+        `ffmpeg -c copy` and mixing resolutions in one file is not safe.
+
+        Args:
+            master_urls (list[str]): The master playlist URL of every part.
+            max_bytes (int, optional): Maximum total size of the download in bytes, including the samples.
+            deadline (float, optional): Maximum time in seconds, including the time spent sampling.
+
+        Returns:
+            list[str]: The chosen index (media playlist) URL of every part.
+        '''
+        if not master_urls:
+            raise ValueError("master_urls is empty. Cannot choose a quality.")
+        start = time.monotonic()
+        parts = [self.get_variants(master_url) for master_url in master_urls]
+
+        # RESOLUTION がない場合は BANDWIDTH で画質を比べる
+        key = 'pixels' if all(v['pixels'] for variants in parts for v in variants) else 'bandwidth'
+
+        def rank(variant):
+            return variant[key] or 0
+
+        parts = [sorted(variants, key=rank, reverse=True) for variants in parts]
+
+        # 尺はどの画質でも同じなので最高画質のプレイリストで測る
+        part_seconds = []
+        for index, variants in enumerate(parts):
+            urls, durations = self.get_segments(variants[0]['url'])
+            part_seconds.append(sum(durations))
+            if index == 0:
+                throughput, top_rate = self.sample(urls, durations)
+        print(f"Measured throughput: {throughput * 8 / 1_000_000:.2f} Mbps")
+
+        # 計測にかかった時間は締め切りから差し引く
+        if deadline is not None:
+            deadline -= time.monotonic() - start
+
+        top = parts[0][0]
+        sample_bytes = sum(len(content) for content in self.samples.values())
+
+        def rate(variant):
+            # 実測ビットレートを BANDWIDTH（なければ画素数）の比で換算する
+            if variant['bandwidth'] and top['bandwidth']:
+                return top_rate * variant['bandwidth'] / top['bandwidth']
+            if variant['pixels'] and top['pixels']:
+                return top_rate * variant['pixels'] / top['pixels']
+            return top_rate
+
+        levels = sorted({rank(v) for variants in parts for v in variants}, reverse=True)
+        for level in levels:
+            picks = [next((v for v in variants if rank(v) <= level), variants[-1]) for variants in parts]
+            est_bytes = sum(rate(v) * seconds for v, seconds in zip(picks, part_seconds))
+            # サンプルは最高画質なら再利用できるが、それ以外では無駄になる
+            reuse = picks[0] is top
+            remaining_bytes = max(est_bytes - sample_bytes, 0) if reuse else est_bytes
+            total_bytes = remaining_bytes + sample_bytes
+            est_time = remaining_bytes / throughput
+            if (max_bytes is None or total_bytes <= max_bytes) and (deadline is None or est_time <= deadline):
+                print(f"Selected quality: {level} {key}, ~{total_bytes / 1024 / 1024:.0f} MB, ~{est_time:.0f} s")
+                break
+        else:
+            print(f"⚠️ No quality fits the budget. Using the lowest one (~{total_bytes / 1024 / 1024:.0f} MB, ~{est_time:.0f} s).")
+
+        if not reuse:
+            self.samples = {}
+        return [v['url'] for v in picks]
@@ -0,0 +1,146 @@
+import time
+import random
+import asyncio
+from collections import deque
+import aiohttp
+
+class RetryPolicy:
+    # ステータスコードごとの分類（ここにない4xxはリトライする）
+    FATAL_STATUSES = {400, 401, 403, 404, 405, 410, 451}
+    TIMEOUT_STATUSES = {408}
+    THROTTLE_STATUSES = {425, 429}
+
+    def __init__(self, total_segments, base_delay=1.0, max_delay=30.0, class_budgets=None,
+                 job_budget=None, window=40, failure_rate=0.5, cooldown=15.0, rng=None):
+        '''
+        Decides whether and how long to wait before retrying a failed segment.
+
+        The delay uses decorrelated jitter (sleep = min(max, uniform(base, prev * 3))),
+        so segments that failed together do not retry together.
+        Every error class has its own attempt budget per segment, and the whole job
+        shares one retry budget. A circuit breaker pauses every request for `cooldown`
+        seconds when the recent failure rate gets too high.
+
+        Args:
+            total_segments (int): The number of segments in the job.
+            base_delay (float, optional): The minimum delay in seconds. Defaults to 1.0.
+            max_delay (float, optional): The maximum delay in seconds. Defaults to 30.0.
+            class_budgets (dict, optional): Max attempts per segment for each error class.
+            job_budget (int, optional): Max retries for the whole job. Defaults to 10% of
+                the segments (at least 50).
+            window (int, optional): How many recent results the breaker looks at. Defaults to 40.
+            failure_rate (float, optional): The failure rate that opens the breaker. Defaults to 0.5.
+            cooldown (float, optional): Seconds the breaker stays open. Defaults to 15.0.
+            rng (random.Random, optional): The random source of the jitter. Defaults to the `random` module.
+        '''
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.class_budgets = {
+            'timeout': 5,
+            'connection': 5,
+            'server': 5,
+            'throttle': 8,
+            'http': 3,
+        }
+        if class_budgets:
+            self.class_budgets.update(class_budgets)
+        self.job_budget = job_budget if job_budget is not None else max(50, total_segments // 10)
+        self.retries_used = 0
+
+        self.results = deque(maxlen=window)
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self.rng = rng or random
+
+    def classify(self, e):
+        '''
+        Sorts an exception into an error class.
+
+        Args:
+            e (Exception): The exception raised while downloading a segment.
+
+        Returns:
+            str: 'fatal', 'timeout', 'throttle', 'server', 'http' or 'connection'.
+        '''
+        if isinstance(e, aiohttp.ClientResponseError):
+            if e.status in self.FATAL_STATUSES:
+                return 'fatal'
+            if e.status in self.TIMEOUT_STATUSES:
+                return 'timeout'
+            if e.status in self.THROTTLE_STATUSES:
+                return 'throttle'
+            if e.status >= 500:
+                return 'server'
+            return 'http'
+        if isinstance(e, asyncio.TimeoutError):
+            return 'timeout'
+        return 'connection'
+
+    def next_delay(self, prev_delay):
+        '''
+        Returns the next delay using decorrelated jitter.
+
+        Args:
+            prev_delay (float | None): The previous delay of this segment, or None on the first retry.
+
+        Returns:
+            float: Seconds to sleep before the next attempt.
+        '''
+        prev_delay = prev_delay or self.base_delay
+        return min(self.max_delay, self.rng.uniform(self.base_delay, prev_delay * 3))
+
+    @property
+    def exhausted(self):
+        '''
+        True once the job-wide retry budget is used up.
+        '''
+        return self.retries_used >= self.job_budget
+
+    def should_retry(self, error_class, attempts):
+        '''
+        Checks the per-class budget of the segment and the job-wide budget.
+        Takes one retry from the job budget when it returns True.
+
+        Args:
+            error_class (str): The class returned by `classify`.
+            attempts (dict): Attempts of this segment so far, keyed by error class.
+
+        Returns:
+            bool: True if the segment should be retried.
+        '''
+        if error_class == 'fatal':
+            return False
+        if attempts.get(error_class, 0) >= self.class_budgets.get(error_class, 0):
+            return False
+        if self.exhausted:
+            return False
+        self.retries_used += 1
+        return True
+
+    def record(self, ok):
+        '''
+        Records the result of a request and opens the breaker if the
+        failure rate of the recent window is too high.
+
+        Args:
+            ok (bool): True if the request succeeded.
+        '''
+        self.results.append(ok)
+        if len(self.results) < self.results.maxlen // 2:
+            return
+        failures = self.results.count(False)
+        if failures / len(self.results) >= self.failure_rate and time.monotonic() >= self.open_until:
+            self.open_until = time.monotonic() + self.cooldown
+            self.results.clear()
+            print(f"⛔ Too many errors. Pausing all downloads for {self.cooldown} seconds.", flush=True)
+
+    async def wait_if_open(self):
+        '''
+        Sleeps while the breaker is open.
+        '''
+        while True:
+            remaining = self.open_until - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
@@ -2,13 +2,17 @@ import requests
 import re
 import subprocess
 import os
+import time
 import asyncio
 import aiohttp
 import aiofiles
+from StreamServer import PlayheadScheduler, HLSServer
+from RetryPolicy import RetryPolicy
 
 class Downloader:
     def __init__(self):
         self.MIN_TS_SIZE = 1 * 1024
+        self.TEMP_FOLDER = r'./temp_download'
 
         self.verify = False
         if not self.verify:
@@ -22,12 +26,22 @@ class Downloader:
             os.makedirs(path)
             print(f'MADE: {path}')
 
-    async def download_segment(self, session: aiohttp.ClientSession, sem, url, file_path):
-        """ 1つの動画セグメントをダウンロードする（リトライ機能付き） """
-        retry_count = 0
-        max_retries = 5  
+    def __check_failed(self, download_failed, temp_folder):
+        # 欠けたセグメントのまま結合しないよう、一時ファイルを残して止める
+        if download_failed:
+            raise RuntimeError(
+                f"{download_failed} segment(s) could not be downloaded. "
+                f"Temporary files are kept in {temp_folder}. DO ONE MORE TIME."
+            )
 
-        while retry_count < max_retries:
+    async def download_segment(self, session: aiohttp.ClientSession, sem, policy: RetryPolicy, url, file_path):
+        """ 1つの動画セグメントをダウンロードする（リトライ機能付き）
+        404などリトライしても無駄なエラーや、リトライの上限に達した場合は None を返す """
+        attempts = {}
+        delay = None
+
+        while True:
+            await policy.wait_if_open()
             try:
                 async with sem:
                     async with session.get(url, timeout=10, ssl=self.verify) as r:
@@ -36,25 +50,36 @@ class Downloader:
                             async for chunk in r.content.iter_chunked(8192):
                                 await f.write(chunk)
                                 # print(f"✅ Downloaded: {file_path}")
+                policy.record(True)
                 return file_path  # 成功時はファイル名を返す
 
             except (asyncio.TimeoutError, aiohttp.ClientError) as e:
-                retry_count += 1
-                wait_time = 5
+                error_class = policy.classify(e)
                 print(f"⚠️ {url} failed: {type(e).__name__}: {e}", flush=True)
-                print(f"🔄 Retrying... ({retry_count}/{max_retries}) Sleep for {wait_time} seconds.", end='\r', flush=True)
-                await asyncio.sleep(wait_time)
-
-        # print(f"❌ Failed to download after {max_retries} retries: {url}", end='\r', flush=True)
+                # 途中まで書き込んだファイルを再開時に使わないよう消す
+                if os.path.exists(file_path):
+                    os.remove(file_path)
 
-        raise RuntimeError(f"Download failed: {url} DO ONE MORE TIME.")
+                # 403が続く場合（トークン切れなど）もブレーカーを開けるよう記録する
+                policy.record(False)
+                if not policy.should_retry(error_class, attempts):
+                    print(f"❌ Not retried: {url} ({error_class})", flush=True)
+                    return None
+                attempts[error_class] = attempts.get(error_class, 0) + 1
+                delay = policy.next_delay(delay)
+                print(f"🔄 Retrying... ({error_class} {attempts[error_class]}/{policy.class_budgets[error_class]}) Sleep for {delay:.1f} seconds.", end='\r', flush=True)
+                await asyncio.sleep(delay)
 
-    async def download_video(self, urls, download_folder, filename):
-        """ 並列処理で動画セグメントをダウンロード（進捗を上書き表示） """
+    async def download_video(self, urls, download_folder, filename, scheduler=None, policy=None):
+        """ 並列処理で動画セグメントをダウンロード（進捗を上書き表示）
+        scheduler を渡すと、プレイヤーの再生位置に近いセグメントから順にダウンロードする
+        (ダウンロードしたファイル, 失敗したセグメント数) を返す """
         self.__check_folder_exsist(download_folder)
         downloaded_files = set()
         total_segments = len(urls)
         completed_segments = 0
+        if policy is None:
+            policy = RetryPolicy(total_segments)
 
         print('#' * 60)
         sem = asyncio.Semaphore(20)
@@ -70,57 +95,76 @@ class Downloader:
             sock_read=30
         )
 
+        pending = []
+        for idx in range(total_segments):
+            file_path = os.path.join(download_folder, f"{filename}{idx}.ts")
+            if os.path.exists(file_path):
+                if os.path.getsize(file_path) > self.MIN_TS_SIZE:
+                    downloaded_files.add(file_path)
+                    completed_segments += 1
+                    if scheduler is not None:
+                        scheduler.mark_done(idx)
+                    progress = (completed_segments / total_segments) * 100
+                    print(f"Download Progress: {progress:.2f}% ({completed_segments}/{total_segments})", end='\r', flush=True)
+                    continue
+                else:
+                    os.remove(file_path)
+            pending.append(idx)
+
+        # 次にダウンロードするセグメントの選び方だけが異なる
+        if scheduler is None:
+            queue = iter(pending)
+            next_index = lambda: next(queue, None)
+        else:
+            next_index = scheduler.next
+
+        async def worker():
+            nonlocal completed_segments
+            while True:
+                # リトライの上限に達したら新しいセグメントは始めない
+                if policy.exhausted:
+                    return
+                idx = next_index()
+                if idx is None:
+                    return
+                file_path = os.path.join(download_folder, f"{filename}{idx}.ts")
+                result = await self.download_segment(session, sem, policy, urls[idx], file_path)
+                if scheduler is not None:
+                    scheduler.mark_done(idx)
+                if result is None:
+                    continue
+                downloaded_files.add(result)
+                completed_segments += 1
+
+                progress = (completed_segments / total_segments) * 100
+                if completed_segments == total_segments:
+                    print(f"Download Progress: {progress:.2f}% ({completed_segments}/{total_segments})")
+                    print('Download Completed.')
+                else:
+                    print(f"Download Progress: {progress:.2f}% ({completed_segments}/{total_segments})", end='\r', flush=True)
+
         async with aiohttp.ClientSession(
             connector=connector,
             timeout=timeout
         ) as session:
-            
-            tasks = []
-
-            for idx, url in enumerate(urls):
-                file_path = os.path.join(download_folder, f"{filename}{idx}.ts")
-                if os.path.exists(file_path):
-                    if os.path.getsize(file_path) > self.MIN_TS_SIZE:
-                        downloaded_files.add(file_path)
-                        completed_segments += 1
-                        progress = (completed_segments / total_segments) * 100
-                        print(f"Download Progress: {progress:.2f}% ({completed_segments}/{total_segments})", end='\r', flush=True)
-                        continue
-                    else:
-                        os.remove(file_path)
-                tasks.append(
-                    asyncio.create_task(
-                        self.download_segment(session, sem, url, file_path)
-                    )
-                )
 
+            workers = [asyncio.create_task(worker()) for _ in range(20)]
             try:
-                for task in asyncio.as_completed(tasks):
-                    result = await task  # ここで RuntimeError が上がる
-                    if result is None:
-                        download_failed += 1
-                        continue
-                    downloaded_files.add(result)
-                    completed_segments += 1
-
-                    progress = (completed_segments / total_segments) * 100
-                    if completed_segments == total_segments:
-                        print(f"Download Progress: {progress:.2f}% ({completed_segments}/{total_segments})")
-                        print('Download Completed.')
-                    else:
-                        print(f"Download Progress: {progress:.2f}% ({completed_segments}/{total_segments})", end='\r', flush=True)
-
+                await asyncio.gather(*workers)
             finally:
                 # 念のため残タスクを完全回収
-                for task in tasks:
+                for task in workers:
                     if not task.done():
                         task.cancel()
-                await asyncio.gather(*tasks, return_exceptions=True)
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        # 失敗したものと、上限に達して始めなかったものを数える
+        download_failed = total_segments - completed_segments
 
         print('#' * 60)
         print()  # 最終進捗表示のあと改行
         print(f"Download Failed Count: {download_failed}")
-        return downloaded_files
+        return downloaded_files, download_failed
     
     def check_fake_extension(self, downloaded_files):
         is_jpeg_fake_video = any(f.endswith('.jpeg') for f in downloaded_files)
@@ -140,16 +184,67 @@ class Downloader:
 
         return renamed_files
 
+    def save_segments(self, segments, urls, filename):
+        """ 既にダウンロード済みのセグメント（画質選択のサンプルなど）を一時フォルダに保存する
+        download_video はこれらをダウンロード済みとして扱う """
+        if not segments:
+            return
+        self.__check_folder_exsist(self.TEMP_FOLDER)
+        for idx, url in enumerate(urls):
+            content = segments.get(url)
+            file_path = os.path.join(self.TEMP_FOLDER, f"{filename}{idx}.ts")
+            if content is not None and not os.path.exists(file_path):
+                with open(file_path, 'wb') as f:
+                    f.write(content)
+
     def get_video(self, urls, output_folder, filename):
-        temp_folder = r'./temp_download'
+        temp_folder = self.TEMP_FOLDER
         """ ダウンロードした動画セグメントを結合してmp4にする """
 
         # check a folder that stores videos
         self.__check_folder_exsist(output_folder)
 
         # 1. ダウンロードする（並列処理）
-        downloaded_files = asyncio.run(self.download_video(urls, temp_folder, filename))
-        
+        downloaded_files, download_failed = asyncio.run(self.download_video(urls, temp_folder, filename))
+        self.__check_failed(download_failed, temp_folder)
+
+        self.merge_video(downloaded_files, temp_folder, output_folder, filename)
+
+    def watch_video(self, urls, durations, output_folder, filename, discontinuities=(), port=8000, wait=None):
+        """ ダウンロードしながらローカルHLSサーバーで再生できるようにする
+        wait はダウンロード完了後、視聴が終わるまでブロックする関数（サーバー停止後に結合する）
+        省略した場合は Ctrl+C が押されるまでサーバーを動かし続ける """
+        temp_folder = self.TEMP_FOLDER
+
+        self.__check_folder_exsist(output_folder)
+        self.__check_folder_exsist(temp_folder)
+
+        paths = [os.path.join(temp_folder, f"{filename}{idx}.ts") for idx in range(len(urls))]
+        scheduler = PlayheadScheduler(len(urls))
+        server = HLSServer(scheduler, paths, durations, discontinuities, port=port)
+        server.start()
+
+        try:
+            downloaded_files, download_failed = asyncio.run(self.download_video(urls, temp_folder, filename, scheduler))
+            # 視聴中にセグメントを消さないよう、結合はサーバー停止後に行う
+            try:
+                (wait or self.wait_for_interrupt)()
+            except (KeyboardInterrupt, EOFError):
+                pass
+        finally:
+            server.stop()
+
+        self.__check_failed(download_failed, temp_folder)
+        self.merge_video(downloaded_files, temp_folder, output_folder, filename)
+
+    def wait_for_interrupt(self):
+        """ Ctrl+C が押されるまでブロックする """
+        print("Download finished. Press Ctrl+C to stop the local server and merge the video...")
+        while True:
+            time.sleep(1)
+
+    def merge_video(self, downloaded_files, temp_folder, output_folder, filename):
+        """ ダウンロード済みのセグメントをffmpegで結合する """
         if not downloaded_files:
             print("No files downloaded. Exiting...")
             return
@@ -0,0 +1,185 @@
+import os
+import math
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class PlayheadScheduler:
+    def __init__(self, total):
+        '''
+        Keeps track of which segments are still pending and hands them out
+        to download workers, nearest to the player's position first.
+
+        Args:
+            total (int): The number of segments in the video.
+        '''
+        self.lock = threading.Lock()
+        self.pending = list(range(total))  # 常にソート済み
+        self.ready = [threading.Event() for _ in range(total)]
+        self.playhead = 0
+
+    def seek(self, index):
+        '''
+        Moves the playhead to the segment the player has just requested.
+        The next call of `next` picks up the new position, so a seek
+        re-prioritizes the queue without waiting for in-flight downloads.
+
+        Args:
+            index (int): The index of the requested segment.
+        '''
+        with self.lock:
+            self.playhead = index
+
+    def next(self):
+        '''
+        Takes the first pending segment at or after the playhead.
+        When everything ahead of the playhead is done, it falls back to
+        the earliest pending segment behind it.
+
+        Returns:
+            int | None: The segment index to download, or None if nothing is left.
+        '''
+        with self.lock:
+            if not self.pending:
+                return None
+            pos = bisect.bisect_left(self.pending, self.playhead)
+            if pos == len(self.pending):
+                pos = 0
+            return self.pending.pop(pos)
+
+    def mark_done(self, index):
+        '''
+        Removes the segment from the queue (if it is still there) and
+        wakes up any request waiting for it.
+
+        Args:
+            index (int): The index of the finished segment.
+        '''
+        with self.lock:
+            pos = bisect.bisect_left(self.pending, index)
+            if pos < len(self.pending) and self.pending[pos] == index:
+                self.pending.pop(pos)
+        self.ready[index].set()
+
+    def wait(self, index, timeout=None):
+        '''
+        Blocks until the segment has been downloaded.
+
+        Args:
+            index (int): The index of the segment.
+            timeout (float, optional): Seconds to wait. Defaults to None (forever).
+
+        Returns:
+            bool: True if the segment is ready.
+        '''
+        return self.ready[index].wait(timeout)
+
+
+class HLSServer:
+    def __init__(self, scheduler, segment_paths, durations, discontinuities=(), host='127.0.0.1', port=8000, timeout=120):
+        '''
+        A small local HTTP server that serves a VOD `.m3u8` playlist and the
+        segments as soon as they are written to disk.
+
+        Args:
+            scheduler (PlayheadScheduler): The scheduler shared with the downloader.
+            segment_paths (list[str]): Local file path of every segment, in order.
+            durations (list[float]): Duration (seconds) of every segment, in order.
+            discontinuities (Iterable[int], optional): Segment indices that start a new part.
+            host (str, optional): The address to bind. Defaults to '127.0.0.1'.
+            port (int, optional): The port to bind. Defaults to 8000.
+            timeout (float, optional): Seconds a request waits for a segment. Defaults to 120.
+        '''
+        self.scheduler = scheduler
+        self.segment_paths = segment_paths
+        self.durations = durations
+        self.discontinuities = set(discontinuities)
+        self.timeout = timeout
+        self.httpd = ThreadingHTTPServer((host, port), self.__make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/index.m3u8'
+
+    def build_playlist(self):
+        '''
+        Builds the full playlist up front, so the player knows the whole
+        timeline and can seek anywhere right away.
+
+        Returns:
+            str: The `.m3u8` playlist text.
+        '''
+        target = math.ceil(max(self.durations, default=0)) or 1
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{target}',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXT-X-PLAYLIST-TYPE:VOD',
+        ]
+        for idx, duration in enumerate(self.durations):
+            if idx in self.discontinuities and idx != 0:
+                lines.append('#EXT-X-DISCONTINUITY')
+            lines.append(f'#EXTINF:{duration:.6f},')
+            lines.append(f'{idx}.ts')
+        lines.append('#EXT-X-ENDLIST')
+        return '\n'.join(lines) + '\n'
+
+    def __make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0].lstrip('/')
+                if path == 'index.m3u8':
+                    body = server.build_playlist().encode('utf-8')
+                    self.__send(200, 'application/vnd.apple.mpegurl', body)
+                    return
+
+                name, ext = os.path.splitext(path)
+                if ext != '.ts' or not name.isdigit() or int(name) >= len(server.segment_paths):
+                    self.send_error(404)
+                    return
+
+                index = int(name)
+                # プレイヤーが要求した位置から先を優先する
+                server.scheduler.seek(index)
+                if not server.scheduler.wait(index, server.timeout):
+                    self.send_error(504, 'Segment is not downloaded yet.')
+                    return
+                try:
+                    with open(server.segment_paths[index], 'rb') as f:
+                        body = f.read()
+                except OSError:
+                    self.send_error(404)
+                    return
+                self.__send(200, 'video/mp2t', body)
+
+            def __send(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # プレイヤーがシークして接続を切った
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f'▶️ Watch now: {self.url}')
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
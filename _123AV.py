@@ -107,15 +107,25 @@ class _123AV:
             index_url (str): The URL to the .m3u8 index file.
 
         Returns:
-            list[str]: A list of .ts segment URLs.
+            tuple[list[str], list[float]]: A list of .ts segment URLs and the duration of each segment.
         '''
         if index_url is None:
             raise ValueError("index url is None.")
         res = self.session.get(index_url, verify=self.verify)
         if res.status_code == 200:
-            matches = re.findall(r'^(?!#).+', res.text, re.MULTILINE)
-            urls = [index_url.rsplit('/', 1)[0] + '/' + match.rsplit('.', 1)[0] + '.ts' for match in matches]
-            return urls
+            urls = []
+            durations = []
+            duration = 0.0
+            for line in res.text.splitlines():
+                line = line.strip()
+                if line.startswith('#EXTINF:'):
+                    # 例: #EXTINF:10.010011,
+                    duration = float(line[len('#EXTINF:'):].split(',')[0])
+                elif line and not line.startswith('#'):
+                    urls.append(index_url.rsplit('/', 1)[0] + '/' + line.rsplit('.', 1)[0] + '.ts')
+                    durations.append(duration)
+                    duration = 0.0
+            return urls, durations
         
     def __get_index_url(self, url):
         '''
@@ -154,7 +164,7 @@ class _123AV:
             return re.sub(r'[\\/*?:"<>|\'() ]', '_', title.text)[:max_length]
         return re.sub(r'[\\/*?:"<>|\'() ]', '_', title.text)
     
-    def dl(self, url, outputfolder):
+    def dl(self, url, outputfolder, watch=False, port=8000, wait=None):
         '''
         Coordinates the full download process: retrieves video metadata,
         constructs the video stream URLs, and downloads the segments
@@ -163,7 +173,14 @@ class _123AV:
         Args:
             url (str): The 123AV video page URL.
             outputfolder (raw str): The folder where the video will be saved.
+            watch (bool, optional): Serve a local .m3u8 while downloading, so the video
+                can be played right away. Defaults to False.
+            port (int, optional): The port of the local server in watch mode. Defaults to 8000.
+            wait (Callable[[], None], optional): In watch mode, called after the download finishes and
+                blocks until you are done watching; the video is merged afterwards. Defaults to None,
+                which keeps serving until Ctrl+C is pressed.
         '''
+
         downloader = Downloader()
         html = self.__get_html(url)
         soup = BeautifulSoup(html, "html.parser")
@@ -178,15 +195,22 @@ class _123AV:
             print('Download all parts and join them into one video.')
 
         segment_urls = []
+        segment_durations = []
+        discontinuities = []
         if video_urls is None:
             raise ValueError("could not get video urls.")
         # Using video_urls, get master url
         for video_url in video_urls:
             master_url = self.__get_master_url(video_url)
             index_url = self.__get_index_url(master_url['stream'])
-            urls = self.__get_segments(index_url)
+            urls, durations = self.__get_segments(index_url)
+            discontinuities.append(len(segment_urls))
             segment_urls.extend(urls)
-        downloader.get_video(segment_urls, outputfolder, title)
+            segment_durations.extend(durations)
+        if watch:
+            downloader.watch_video(segment_urls, segment_durations, outputfolder, title, discontinuities, port, wait)
+        else:
+            downloader.get_video(segment_urls, outputfolder, title)
 
 '''
 By updating, these methods are not used right now.
@@ -0,0 +1,44 @@
+'''
+Command line entry point.
+
+    python -m cli https://123av.com/en/v/fc2-ppv-4828384 -o ./videos
+
+The downloader is imported only after the arguments are parsed, and Selenium
+only when the browser is actually used, so `--help` starts instantly.
+'''
+import argparse
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='123av-dl', description='Download a 123AV video as a single .mp4.')
+    parser.add_argument('url', help='The 123AV video page URL.')
+    parser.add_argument('-o', '--output', default='.', help='The folder where the video will be saved.')
+    parser.add_argument('--no-browser', action='store_true',
+                        help='Read the stream URL from the static HTML instead of using Chrome (Selenium).')
+    parser.add_argument('--watch', action='store_true',
+                        help='Serve a local .m3u8 while downloading, so the video can be played right away.')
+    parser.add_argument('--port', type=int, default=8000, help='The port of the local server in watch mode.')
+    parser.add_argument('--max-bytes', type=int, help='Download the highest quality that fits in this many bytes.')
+    parser.add_argument('--deadline', type=float,
+                        help='Download the highest quality that finishes within this many seconds.')
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    options = {'watch': args.watch, 'port': args.port}
+    if args.watch:
+        options['wait'] = lambda: input("Press Enter to stop the local server and merge the video...")
+    if args.no_browser:
+        if args.max_bytes is not None or args.deadline is not None:
+            parser.error('--max-bytes and --deadline need the master playlist, so they cannot be used with --no-browser.')
+        from _123AV import _123AV
+    else:
+        from sub_processes.slow_123AV import _123AV
+        options.update(max_bytes=args.max_bytes, deadline=args.deadline)
+
+    app = _123AV()
+    app.dl(args.url, args.output, **options)
+
+if __name__ == '__main__':
+    main()
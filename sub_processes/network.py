@@ -1,18 +1,16 @@
-from seleniumwire import webdriver  # selenium-wire
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
 import time
 import threading
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 
 class _123AVWebManager:
     def __init__(self):
         self.driver = self.setup()
 
     def setup(self):
+        from seleniumwire import webdriver  # selenium-wire
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        from webdriver_manager.chrome import ChromeDriverManager
+
         options = Options()
         # options.add_argument('--headless=new')
         options.add_argument("--disable-gpu")
@@ -60,6 +58,10 @@ class _123AVWebManager:
     
 
     def click(self, index):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
         wait = WebDriverWait(self.driver, 10)
         element = wait.until(
             EC.element_to_be_clickable((By.CSS_SELECTOR, f'#scenes [data-index="{index}"]'))
@@ -2,9 +2,9 @@ import requests
 from bs4 import BeautifulSoup
 import re
 from SegmentsDownload import Downloader
+from QualitySelector import QualitySelector
 import json
 import demjson3
-from sub_processes.network import _123AVWebManager
 
 import time
 
@@ -14,12 +14,23 @@ class _123AV:
         Initializes the _123AV class with a persistent HTTP session.
         '''
         self.session = requests.Session()
-        self.web_manager = _123AVWebManager()
+        self._web_manager = None
         self.verify = False
         if not self.verify:
             from urllib3.exceptions import InsecureRequestWarning
             requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+    @property
+    def web_manager(self):
+        '''
+        Starts the browser on first use, so code paths that never need
+        Selenium do not pay for importing or launching it.
+        '''
+        if self._web_manager is None:
+            from sub_processes.network import _123AVWebManager
+            self._web_manager = _123AVWebManager()
+        return self._web_manager
+
     def __get_html(self, url):
         '''
         Retrieves the raw static HTML content from the specified URL using a simple HTTP GET request.
@@ -99,15 +110,25 @@ class _123AV:
             index_url (str): The URL to the .m3u8 index file.
 
         Returns:
-            list[str]: A list of .ts segment URLs.
+            tuple[list[str], list[float]]: A list of .ts segment URLs and the duration of each segment.
         '''
         if index_url is None:
             raise ValueError("index url is None.")
         res = self.session.get(index_url, verify=self.verify)
         if res.status_code == 200:
-            matches = re.findall(r'^(?!#).+', res.text, re.MULTILINE)
-            urls = [index_url.rsplit('/', 1)[0] + '/' + match.rsplit('.', 1)[0] + '.ts' for match in matches]
-            return urls
+            urls = []
+            durations = []
+            duration = 0.0
+            for line in res.text.splitlines():
+                line = line.strip()
+                if line.startswith('#EXTINF:'):
+                    # 例: #EXTINF:10.010011,
+                    duration = float(line[len('#EXTINF:'):].split(',')[0])
+                elif line and not line.startswith('#'):
+                    urls.append(index_url.rsplit('/', 1)[0] + '/' + line.rsplit('.', 1)[0] + '.ts')
+                    durations.append(duration)
+                    duration = 0.0
+            return urls, durations
         else:
             raise Exception(f"Failed to get index_url: {res.status_code}")
         
@@ -162,7 +183,7 @@ class _123AV:
             return re.sub(r'[\\/*?:"<>|\'() ]', '_', title.text)[:max_length]
         return re.sub(r'[\\/*?:"<>|\'() ]', '_', title.text)
     
-    def dl(self, url, outputfolder):
+    def dl(self, url, outputfolder, watch=False, port=8000, wait=None, max_bytes=None, deadline=None):
         '''
         Coordinates the full download process: retrieves video metadata,
         constructs the video stream URLs, and downloads the segments
@@ -171,7 +192,18 @@ class _123AV:
         Args:
             url (str): The 123AV video page URL.
             outputfolder (raw str): The folder where the video will be saved.
+            watch (bool, optional): Serve a local .m3u8 while downloading, so the video
+                can be played right away. Defaults to False.
+            port (int, optional): The port of the local server in watch mode. Defaults to 8000.
+            wait (Callable[[], None], optional): In watch mode, called after the download finishes and
+                blocks until you are done watching; the video is merged afterwards. Defaults to None,
+                which keeps serving until Ctrl+C is pressed.
+            max_bytes (int, optional): Download the highest quality that fits in this many bytes.
+                Defaults to None (no limit).
+            deadline (float, optional): Download the highest quality that finishes within this many
+                seconds, based on the measured throughput. Defaults to None (no limit).
         '''
+
         downloader = Downloader()
         html = self.__get_html(url)
         soup = BeautifulSoup(html, "html.parser")
@@ -186,17 +218,37 @@ class _123AV:
             print('Download all parts and join them into one video.')
 
         segment_urls = []
+        segment_durations = []
+        discontinuities = []
         if video_urls is None:
             raise ValueError("could not get video urls.")
         # Using video_urls, get master url
+        master_urls = []
         for index, video_url in enumerate(video_urls):
             print(f"URL: {url}")
             master_url = self.__get_master_url(url)
             print(f"MASTER URL: {master_url}")
-            index_url = self.__get_index_url(master_url)
-            print(f"INDEX URL: {index_url}")
-            urls = self.__get_segments(index_url)
-            segment_urls.extend(urls)
+            master_urls.append(master_url)
             if index < len(video_urls) - 1:
                 self.web_manager.click(index + 1)
-        downloader.get_video(segment_urls, outputfolder, title)
\ No newline at end of file
+
+        selector = None
+        if max_bytes is None and deadline is None:
+            index_urls = [self.__get_index_url(master_url) for master_url in master_urls]
+        else:
+            selector = QualitySelector(self.session, self.__get_segments, self.verify)
+            index_urls = selector.choose(master_urls, max_bytes, deadline)
+
+        for index_url in index_urls:
+            print(f"INDEX URL: {index_url}")
+            urls, durations = self.__get_segments(index_url)
+            discontinuities.append(len(segment_urls))
+            segment_urls.extend(urls)
+            segment_durations.extend(durations)
+        if selector is not None:
+            # 画質選択で計測に使ったセグメントは再ダウンロードしない
+            downloader.save_segments(selector.samples, segment_urls, title)
+        if watch:
+            downloader.watch_video(segment_urls, segment_durations, outputfolder, title, discontinuities, port, wait)
+        else:
+            downloader.get_video(segment_urls, outputfolder, title)
\ No newline at end of file
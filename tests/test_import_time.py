@@ -0,0 +1,63 @@
+import subprocess
+import sys
+import os
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# 起動時にロードしてはいけない重い依存
+HEAVY_MODULES = {'requests', 'aiohttp', 'bs4', 'demjson3', 'selenium', 'seleniumwire', 'webdriver_manager'}
+# ブラウザを使うまでロードしてはいけない依存
+BROWSER_MODULES = {'selenium', 'seleniumwire', 'webdriver_manager'}
+BUDGET_US = 300_000
+
+
+def import_times(*args):
+    '''
+    Runs Python with `-X importtime` in a fresh interpreter.
+
+    Args:
+        *args (str): Arguments after `python -X importtime`.
+
+    Returns:
+        list[tuple[str, int, int]]: (module, nesting depth, cumulative time in us) of every import.
+    '''
+    res = subprocess.run(
+        [sys.executable, '-X', 'importtime', *args],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    times = []
+    for line in res.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 先頭の空白1つのあと、ネストの深さ分だけ空白2つが続く
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), depth, int(cumulative)))
+    return times
+
+
+def loaded_packages(times):
+    return {name.split('.')[0] for name, _, _ in times}
+
+
+def test_cli_help_cold_start_within_budget():
+    times = import_times('-m', 'cli', '--help')
+    total = sum(cumulative for _, depth, cumulative in times if depth == 0)
+    assert total < BUDGET_US
+
+
+def test_cli_help_does_not_import_heavy_dependencies():
+    times = import_times('-m', 'cli', '--help')
+    assert not loaded_packages(times) & HEAVY_MODULES
+
+
+def test_browser_modules_do_not_import_selenium():
+    for module in ('requests', 'bs4', 'demjson3', 'aiohttp', 'aiofiles'):
+        pytest.importorskip(module)
+    # network.py も含め、ブラウザを起動するまで Selenium をロードしない
+    times = import_times('-c', 'import sub_processes.slow_123AV, sub_processes.network')
+    assert {'sub_processes.slow_123AV', 'sub_processes.network'} <= {name for name, _, _ in times}
+    assert not loaded_packages(times) & BROWSER_MODULES
@@ -0,0 +1,153 @@
+import asyncio
+import os
+
+import pytest
+
+import QualitySelector as quality
+from QualitySelector import QualitySelector
+
+SEGMENTS = 20
+HI_SIZE = 500_000  # 1秒あたりのバイト数
+
+
+class FakeResponse:
+    def __init__(self, text='', content=b''):
+        self.status_code = 200
+        self.text = text
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    '''
+    Serves a master playlist with a 1080p (4 Mbps) and a 480p (1 Mbps) variant,
+    each 20 one-second segments long.
+    '''
+    def __init__(self, resolution=True):
+        hi = ',RESOLUTION=1920x1080' if resolution else ''
+        lo = ',RESOLUTION=854x480' if resolution else ''
+        self.master = (
+            '#EXTM3U\n'
+            f'#EXT-X-STREAM-INF:BANDWIDTH=1000000{lo}\nlo/v.m3u8\n'
+            f'#EXT-X-STREAM-INF:BANDWIDTH=4000000{hi}\nhi/v.m3u8\n'
+        )
+
+    def get(self, url, verify=False, timeout=None):
+        if url.endswith('master.m3u8'):
+            return FakeResponse(text=self.master)
+        size = HI_SIZE if '/hi/' in url else HI_SIZE // 4
+        return FakeResponse(content=b'x' * size)
+
+
+def get_segments(index_url):
+    base = index_url.rsplit('/', 1)[0]
+    return [f'{base}/s{i}.ts' for i in range(SEGMENTS)], [1.0] * SEGMENTS
+
+
+MASTER = 'http://example.com/master.m3u8'
+
+
+def make_selector(resolution=True):
+    return QualitySelector(FakeSession(resolution), get_segments)
+
+
+def test_byte_budget_picks_highest_fitting_variant():
+    # 最高画質は 20 * 500KB = 10MB、低画質は 2.5MB
+    assert make_selector().choose([MASTER], max_bytes=20_000_000) == ['http://example.com/hi/v.m3u8']
+    assert make_selector().choose([MASTER], max_bytes=5_000_000) == ['http://example.com/lo/v.m3u8']
+
+
+def test_byte_budget_covers_all_parts():
+    # 2パートで最高画質は 20MB になる
+    urls = make_selector().choose([MASTER, MASTER], max_bytes=15_000_000)
+    assert urls == ['http://example.com/lo/v.m3u8'] * 2
+
+
+def test_no_fit_falls_back_to_lowest():
+    assert make_selector().choose([MASTER], max_bytes=100) == ['http://example.com/lo/v.m3u8']
+
+
+def test_bandwidth_is_used_without_resolution():
+    selector = make_selector(resolution=False)
+    assert selector.choose([MASTER], max_bytes=20_000_000) == ['http://example.com/hi/v.m3u8']
+    assert selector.choose([MASTER], max_bytes=5_000_000) == ['http://example.com/lo/v.m3u8']
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(quality, 'time', clock)
+    return clock
+
+
+def sampler(clock, seconds):
+    # 1MB/s を計測し、計測に seconds 秒かかったことにする
+    def sample(urls, durations):
+        clock.now += seconds
+        return 1_000_000, HI_SIZE
+    return sample
+
+
+def test_deadline_picks_variant_that_finishes_in_time(clock):
+    # 最高画質は 10 秒、低画質は 2.5 秒かかる
+    selector = make_selector()
+    selector.sample = sampler(clock, 0)
+    assert selector.choose([MASTER], deadline=12) == ['http://example.com/hi/v.m3u8']
+    assert selector.choose([MASTER], deadline=5) == ['http://example.com/lo/v.m3u8']
+
+
+def test_deadline_subtracts_sampling_time(clock):
+    selector = make_selector()
+    selector.sample = sampler(clock, 8)
+    assert selector.choose([MASTER], deadline=12) == ['http://example.com/lo/v.m3u8']
+
+
+def test_empty_master_urls():
+    with pytest.raises(ValueError):
+        make_selector().choose([], max_bytes=1)
+
+
+def test_samples_count_against_byte_budget(capsys):
+    # 低画質 2.5MB + 捨てる最高画質のサンプル 3 * 500KB = 4MB
+    selector = make_selector()
+    assert selector.choose([MASTER], max_bytes=3_500_000) == ['http://example.com/lo/v.m3u8']
+    assert 'No quality fits' in capsys.readouterr().out
+    assert selector.choose([MASTER], max_bytes=4_000_000) == ['http://example.com/lo/v.m3u8']
+    assert 'No quality fits' not in capsys.readouterr().out
+
+
+def test_samples_are_kept_only_for_the_sampled_variant():
+    selector = make_selector()
+    selector.choose([MASTER], max_bytes=20_000_000)
+    assert sorted(selector.samples) == [f'http://example.com/hi/s{i}.ts' for i in range(3)]
+
+    selector.choose([MASTER], max_bytes=5_000_000)
+    assert selector.samples == {}
+
+
+def test_saved_samples_are_reused_by_download_video(tmp_path, monkeypatch):
+    from SegmentsDownload import Downloader
+
+    monkeypatch.chdir(tmp_path)
+    selector = make_selector()
+    urls, _ = get_segments(selector.choose([MASTER], max_bytes=20_000_000)[0])
+
+    downloader = Downloader()
+    downloader.save_segments(selector.samples, urls, 'v')
+    assert sorted(os.listdir(downloader.TEMP_FOLDER)) == ['v0.ts', 'v1.ts', 'v2.ts']
+    assert os.path.getsize(os.path.join(downloader.TEMP_FOLDER, 'v0.ts')) == HI_SIZE
+
+    # 保存済みのセグメントはダウンロード済みとして数えられる（通信しない）
+    downloaded_files, download_failed = asyncio.run(downloader.download_video(urls[:3], downloader.TEMP_FOLDER, 'v'))
+    assert len(downloaded_files) == 3
+    assert download_failed == 0
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from RetryPolicy import RetryPolicy
+from SegmentsDownload import Downloader
+
+
+class FailureServer:
+    '''
+    A local aiohttp server that answers /<name>.ts with the status codes
+    queued for that name, then with 200 once the queue is empty.
+    '''
+    def __init__(self):
+        self.hits = Counter()
+        self.plans = {}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    async def handle(self, request):
+        name = request.match_info['name']
+        self.hits[name] += 1
+        plan = self.plans.get(name, [])
+        if plan:
+            return web.Response(status=plan.pop(0))
+        return web.Response(body=b'x' * 2048)
+
+    async def start_app(self):
+        app = web.Application()
+        app.router.add_get('/{name}.ts', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        return self.runner.addresses[0][1]
+
+    def start(self):
+        self.thread.start()
+        self.port = asyncio.run_coroutine_threadsafe(self.start_app(), self.loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def url(self, name):
+        return f'http://127.0.0.1:{self.port}/{name}.ts'
+
+
+@pytest.fixture
+def server():
+    server = FailureServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+def fast_policy(**kwargs):
+    kwargs.setdefault('base_delay', 0.001)
+    kwargs.setdefault('max_delay', 0.01)
+    kwargs.setdefault('cooldown', 0.01)
+    kwargs.setdefault('rng', random.Random(0))
+    return RetryPolicy(10, **kwargs)
+
+
+def download(server, name, policy, path):
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            sem = asyncio.Semaphore(1)
+            return await Downloader().download_segment(session, sem, policy, server.url(name), path)
+    return asyncio.run(run())
+
+
+def test_404_is_requested_once(server, tmp_path):
+    server.plans['missing'] = [404]
+    result = download(server, 'missing', fast_policy(), str(tmp_path / 'missing.ts'))
+    assert result is None
+    assert server.hits['missing'] == 1
+
+
+def test_503_is_retried_then_succeeds(server, tmp_path):
+    server.plans['flaky'] = [503, 503]
+    path = str(tmp_path / 'flaky.ts')
+    policy = fast_policy()
+    assert download(server, 'flaky', policy, path) == path
+    assert server.hits['flaky'] == 3
+    assert policy.retries_used == 2
+
+
+def test_408_is_retried(server, tmp_path):
+    server.plans['slow'] = [408]
+    path = str(tmp_path / 'slow.ts')
+    assert download(server, 'slow', fast_policy(), path) == path
+    assert server.hits['slow'] == 2
+
+
+def test_job_budget_gives_up_without_raising(server, tmp_path):
+    server.plans['down'] = [503] * 10
+    policy = fast_policy(job_budget=2)
+    assert download(server, 'down', policy, str(tmp_path / 'down.ts')) is None
+    assert server.hits['down'] == 3
+    assert policy.retries_used == 2
+    assert policy.exhausted
+
+
+def test_fatal_errors_open_breaker(server, tmp_path):
+    policy = fast_policy(window=4, cooldown=60)
+    for name in ('a', 'b'):
+        server.plans[name] = [403]
+        assert download(server, name, policy, str(tmp_path / f'{name}.ts')) is None
+    assert policy.open_until > time.monotonic()
+
+
+def test_exhausted_budget_stops_new_segments(server, tmp_path):
+    # ワーカー数（20）より多いセグメントを用意する
+    for idx in range(30):
+        server.plans[str(idx)] = [503] * 10
+    urls = [server.url(str(idx)) for idx in range(30)]
+    policy = fast_policy(job_budget=1, window=100)
+
+    async def run():
+        return await Downloader().download_video(urls, str(tmp_path), 'v', policy=policy)
+    downloaded_files, download_failed = asyncio.run(run())
+
+    assert downloaded_files == set()
+    assert download_failed == 30
+    # 上限に達した後は新しいセグメントを要求しない
+    assert len(server.hits) < 30
+    assert not os.listdir(tmp_path)
+
+
+def test_failed_segment_stops_before_merge(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server.plans['1'] = [404]
+    urls = [server.url(str(idx)) for idx in range(3)]
+    with pytest.raises(RuntimeError):
+        Downloader().get_video(urls, str(tmp_path / 'out'), '')
+    # 結合せず、一時ファイルを残す
+    assert sorted(os.listdir(tmp_path / 'temp_download')) == ['0.ts', '2.ts']
+    assert not os.listdir(tmp_path / 'out')
+
+
+def test_record_opens_breaker():
+    policy = fast_policy(window=4, failure_rate=0.5, cooldown=0.05)
+    policy.record(True)
+    assert policy.open_until == 0.0
+    policy.record(False)
+    policy.record(False)
+    assert policy.open_until > time.monotonic()
+
+    start = time.monotonic()
+    asyncio.run(policy.wait_if_open())
+    assert time.monotonic() >= policy.open_until
+    assert time.monotonic() - start < 1
+
+
+def test_classify_statuses():
+    policy = fast_policy()
+
+    def error(status):
+        return aiohttp.ClientResponseError(None, (), status=status)
+
+    assert policy.classify(error(404)) == 'fatal'
+    assert policy.classify(error(408)) == 'timeout'
+    assert policy.classify(error(425)) == 'throttle'
+    assert policy.classify(error(429)) == 'throttle'
+    assert policy.classify(error(503)) == 'server'
+    assert policy.classify(error(418)) == 'http'
+    assert policy.classify(asyncio.TimeoutError()) == 'timeout'
@@ -0,0 +1,90 @@
+import urllib.request
+import urllib.error
+
+import pytest
+
+from StreamServer import PlayheadScheduler, HLSServer
+
+
+def test_next_starts_at_playhead():
+    scheduler = PlayheadScheduler(10)
+    assert [scheduler.next(), scheduler.next()] == [0, 1]
+    scheduler.seek(7)
+    assert [scheduler.next(), scheduler.next(), scheduler.next()] == [7, 8, 9]
+
+
+def test_next_falls_back_to_earliest_behind_playhead():
+    scheduler = PlayheadScheduler(5)
+    scheduler.seek(3)
+    assert [scheduler.next() for _ in range(5)] == [3, 4, 0, 1, 2]
+    assert scheduler.next() is None
+
+
+def test_mark_done_removes_queued_index():
+    scheduler = PlayheadScheduler(3)
+    assert not scheduler.ready[1].is_set()
+    scheduler.mark_done(1)
+    assert scheduler.ready[1].is_set()
+    assert scheduler.wait(1, timeout=0)
+    assert [scheduler.next() for _ in range(3)] == [0, 2, None]
+
+
+def test_build_playlist_marks_discontinuities():
+    scheduler = PlayheadScheduler(4)
+    server = HLSServer(scheduler, [''] * 4, [10.0, 10.0, 4.5, 10.0], discontinuities=[0, 2], port=0)
+    try:
+        lines = server.build_playlist().splitlines()
+    finally:
+        server.httpd.server_close()
+
+    assert '#EXT-X-TARGETDURATION:10' in lines
+    assert lines.count('#EXT-X-DISCONTINUITY') == 1
+    # 2番目のパートの先頭セグメントの直前だけに入る
+    pos = lines.index('#EXT-X-DISCONTINUITY')
+    assert lines[pos + 1:pos + 3] == ['#EXTINF:4.500000,', '2.ts']
+    assert lines[-1] == '#EXT-X-ENDLIST'
+
+
+@pytest.fixture
+def served(tmp_path):
+    paths = [str(tmp_path / f'{idx}.ts') for idx in range(3)]
+    scheduler = PlayheadScheduler(3)
+    server = HLSServer(scheduler, paths, [10.0] * 3, port=0, timeout=0.1)
+    server.start()
+    base = server.url.rsplit('/', 1)[0]
+    yield scheduler, paths, base
+    server.stop()
+
+
+def status(url):
+    try:
+        with urllib.request.urlopen(url) as res:
+            return res.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_handler_returns_504_until_downloaded(served):
+    scheduler, paths, base = served
+    assert status(f'{base}/1.ts') == 504
+    # 要求された位置が優先される
+    assert scheduler.playhead == 1
+
+
+def test_handler_returns_404_for_bad_paths(served):
+    scheduler, paths, base = served
+    assert status(f'{base}/3.ts') == 404
+    assert status(f'{base}/abc.ts') == 404
+    assert status(f'{base}/0.mp4') == 404
+
+
+def test_handler_serves_segment_after_mark_done(served):
+    scheduler, paths, base = served
+    with open(paths[2], 'wb') as f:
+        f.write(b'segment')
+    scheduler.mark_done(2)
+    with urllib.request.urlopen(f'{base}/2.ts') as res:
+        assert res.headers['Content-Type'] == 'video/mp2t'
+        assert res.read() == b'segment'
+    with urllib.request.urlopen(f'{base}/index.m3u8') as res:
+        assert res.read().startswith(b'#EXTM3U')